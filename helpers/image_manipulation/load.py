@@ -4,8 +4,11 @@ from io import BytesIO
 from typing import Union, IO, Any
 
 import numpy as np
+import torch
 
 from PIL import Image, PngImagePlugin
+from PIL.ImageOps import exif_transpose
+from torchvision.io import decode_jpeg, ImageReadMode
 
 
 logger = logging.getLogger(__name__)
@@ -34,6 +37,18 @@ except Exception as e:
 
 LARGE_ENOUGH_NUMBER = 100
 PngImagePlugin.MAX_TEXT_CHUNK = LARGE_ENOUGH_NUMBER * (1024**2)
+JPEG_MAGIC = b"\xff\xd8\xff"
+EXIF_ORIENTATION_TAG = 0x0112
+# The CHW tensor equivalents of the transpositions PIL's exif_transpose applies.
+EXIF_ORIENTATION_TENSOR_OPS = {
+    2: lambda t: t.flip(-1),
+    3: lambda t: t.flip(-2, -1),
+    4: lambda t: t.flip(-2),
+    5: lambda t: t.transpose(-2, -1).contiguous(),
+    6: lambda t: t.rot90(-1, (-2, -1)),
+    7: lambda t: t.transpose(-2, -1).flip(-2, -1),
+    8: lambda t: t.rot90(1, (-2, -1)),
+}
 
 
 def decode_image_with_opencv(nparr: np.ndarray) -> Union[Image.Image, None]:
@@ -103,3 +118,66 @@ def load_image(img_data: Union[bytes, IO[Any], str]) -> Image.Image:
     if img is None:
         img = decode_image_with_pil(img_data)
     return img
+
+
+def read_exif_orientation(img_data: bytes) -> int:
+    """
+    Read the EXIF orientation from the image header without decoding the pixels.
+
+    Malformed EXIF is treated as upright rather than failing the whole decode.
+    """
+    try:
+        return Image.open(BytesIO(img_data)).getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception as e:
+        logger.warning(f"Could not read EXIF orientation, assuming upright: {e}")
+        return 1
+
+
+def decode_to_tensor(
+    img_data: Union[bytes, IO[Any], str], device: Union[str, torch.device] = "cpu"
+) -> torch.Tensor:
+    """
+    Decode an image straight to a uint8 CHW RGB tensor.
+
+    JPEGs are decoded by torchvision without going through PIL, using
+    libjpeg-turbo on the CPU or nvJPEG when a CUDA device is given.
+    Anything else falls back to load_image.
+
+    The data backends don't read through this yet: TrainingSample crops and
+    resizes PIL images, so this is only for images already at their final size.
+    The result can go straight into MultiaspectImage.get_image_transforms().
+    """
+    if isinstance(img_data, str):
+        with open(img_data, "rb") as file:
+            img_data = file.read()
+    elif hasattr(img_data, "read"):
+        img_data = img_data.read()
+
+    if img_data[:3] == JPEG_MAGIC:
+        try:
+            # nvJPEG ignores EXIF, so the orientation is read from the header and applied here.
+            orientation = read_exif_orientation(img_data)
+            image = decode_jpeg(
+                torch.frombuffer(bytearray(img_data), dtype=torch.uint8),
+                mode=ImageReadMode.RGB,
+                device=device,
+            )
+            if orientation in EXIF_ORIENTATION_TENSOR_OPS:
+                image = EXIF_ORIENTATION_TENSOR_OPS[orientation](image)
+            return image
+        except RuntimeError as e:
+            logger.warning(f"Error decoding JPEG with torchvision, using PIL: {e}")
+
+    pixels = np.asarray(load_image(img_data))
+    return torch.from_numpy(np.ascontiguousarray(pixels.transpose(2, 0, 1))).to(device)
+
+
+def maybe_exif_transpose(image: Image.Image) -> Image.Image:
+    """
+    Apply exif_transpose only when the image actually carries a non-default orientation.
+
+    exif_transpose returns a full copy of the image even when there is nothing to do.
+    """
+    if image.getexif().get(EXIF_ORIENTATION_TAG, 1) == 1:
+        return image
+    return exif_transpose(image)
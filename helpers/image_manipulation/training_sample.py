@@ -1,6 +1,6 @@
 from PIL import Image
-from PIL.ImageOps import exif_transpose
 from helpers.multiaspect.image import MultiaspectImage, resize_helpers
+from helpers.image_manipulation.load import maybe_exif_transpose
 from helpers.image_manipulation.cropping import crop_handlers
 from helpers.training.state_tracker import StateTracker
 from helpers.training.multi_process import should_log
@@ -396,9 +396,9 @@ class TrainingSample:
         """
         # We'll run the target size calculator logic without updating any of the object attributes.
         # This will prevent contamination of the final values that the image will represent.
-        _, calculated_intermediary_size, _ = self.target_size_calculator(
+        calculated_intermediary_size = self.target_size_calculator(
             self.original_aspect_ratio, self.target_downsample_size, self.original_size
-        )
+        ).intermediary
         # The calculated_intermediary_size's purpose is to resize to this value before cropping to target_size.
         # If the intermediary size is smaller than target_size on either edge, the cropping will result in black bars.
         # We have to calculate the scale factor and adjust the image edges proportionally to avoid squishing it.
@@ -465,9 +465,9 @@ class TrainingSample:
         if self.crop_enabled:
             if self.crop_aspect == "square":
                 self.target_size = (self.pixel_resolution, self.pixel_resolution)
-                _, self.intermediary_size, _ = self.target_size_calculator(
+                self.intermediary_size = self.target_size_calculator(
                     self.aspect_ratio, self.resolution, self.original_size
-                )
+                ).intermediary
                 self.aspect_ratio = 1.0
                 self.correct_intermediary_square_size()
                 square_crop_metadata = (
@@ -512,7 +512,7 @@ class TrainingSample:
         if self.image:
             # Convert image to RGB to remove any alpha channel and apply EXIF data transformations
             self.image = self.image.convert("RGB")
-            self.image = exif_transpose(self.image)
+            self.image = maybe_exif_transpose(self.image)
         return self
 
     def crop(self):
@@ -3,29 +3,198 @@ from PIL import Image
 import logging
 import os
 import numpy as np
+import torch
 from math import sqrt
+from functools import partial
+from collections import namedtuple
 from helpers.training.state_tracker import StateTracker
 
 logger = logging.getLogger("MultiaspectImage")
 logger.setLevel(os.environ.get("SIMPLETUNER_IMAGE_PREP_LOG_LEVEL", "INFO"))
 
+# What the sizing helpers return; it still unpacks like the plain 3-tuple it replaced.
+SizingResult = namedtuple("SizingResult", "target intermediary aspect")
+
+# The bucket settings are read for every sample, so we keep them around for as
+#  long as StateTracker keeps handing back the same args object.
+_bucket_settings_args = None
+_bucket_settings = (None, None)
+# Area sizing results per megapixel size, as (aspect map, {aspect ratio: result}).
+#  They depend on the bucket settings above and on the aspect-resolution map they
+#  were read from, so they are dropped when either of those is replaced.
+_size_cache = {}
+# Target sizes for every two-decimal aspect ratio from 0.25 to 4.0, keyed by
+#  megapixels. Also tied to the bucket settings.
+_bucket_table_aspects = np.arange(25, 401) / 100
+_bucket_tables = {}
+
+
+def _refresh_bucket_settings(args):
+    global _bucket_settings_args, _bucket_settings
+    _bucket_settings = (args.aspect_bucket_alignment, args.aspect_bucket_rounding)
+    _bucket_settings_args = args
+    _size_cache.clear()
+    _bucket_tables.clear()
+
+
+# The sizing helpers fetch (alignment, rounding) once per call and pass them down,
+#  so a sample costs one get_args() rather than one per rounding step.
+def _get_bucket_settings():
+    args = StateTracker.get_args()
+    if args is not _bucket_settings_args:
+        _refresh_bucket_settings(args)
+    return _bucket_settings
+
+
+def _get_alignment():
+    args = StateTracker.get_args()
+    if args is not _bucket_settings_args:
+        _refresh_bucket_settings(args)
+    return _bucket_settings[0]
+
+
+def _get_rounding():
+    args = StateTracker.get_args()
+    if args is not _bucket_settings_args:
+        _refresh_bucket_settings(args)
+    return _bucket_settings[1]
+
+
+def _round_to_nearest_multiple_array(values: np.ndarray, multiple: int):
+    # np.round rounds halves to even, like the scalar helper.
+    rounded = np.round(values / multiple).astype(np.int64) * multiple
+    return np.maximum(rounded, multiple)
+
+
+def _area_target_sizes(aspect_ratios: np.ndarray, target_pixel_edge: int):
+    multiple = _get_alignment()
+    sqrt_aspect_ratios = np.sqrt(aspect_ratios)
+    return np.stack(
+        [
+            _round_to_nearest_multiple_array(
+                target_pixel_edge * sqrt_aspect_ratios, multiple
+            ),
+            _round_to_nearest_multiple_array(
+                target_pixel_edge / sqrt_aspect_ratios, multiple
+            ),
+        ],
+        axis=1,
+    )
+
+
+def _get_bucket_table(megapixels: float, target_pixel_edge: int):
+    table = _bucket_tables.get(megapixels)
+    if table is None:
+        table = _area_target_sizes(_bucket_table_aspects, target_pixel_edge)
+        _bucket_tables[megapixels] = table
+    return table
+
+
+# Anything that isn't 8-bit pixel data goes through torchvision as before.
+_legacy_image_transforms = transforms.Compose(
+    [
+        transforms.ToTensor(),
+        transforms.Normalize([0.5], [0.5]),
+    ]
+)
+
+
+def _uint8_pixels_to_tensor(pixels: np.ndarray):
+    # np.asarray(image) is a read-only copy of the PIL pixels. An RGB transpose copies
+    #  it again into writable memory; a single-channel one is already contiguous, so
+    #  np.require only copies when the tensor would otherwise share the read-only buffer.
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    return torch.from_numpy(
+        np.require(pixels.transpose(2, 0, 1), requirements=["C", "W"])
+    )
+
+
+def _to_channels_last(tensor: torch.Tensor):
+    if tensor.dim() == 4:
+        return tensor.contiguous(memory_format=torch.channels_last)
+    # There is no memory format for a single CHW image, so lay it out as HWC by hand.
+    return tensor.permute(1, 2, 0).contiguous().permute(2, 0, 1)
+
+
+def _to_normalized_tensor(image, channels_last: bool = False):
+    """
+    Convert a uint8 image to a CHW float tensor normalised to [-1, 1].
+
+    This is ToTensor + Normalize([0.5], [0.5]) folded into one affine pass,
+    without the intermediate [0, 1] float tensor. A uint8 (N)CHW tensor, eg. from
+    decode_to_tensor, only needs the affine step and stays on its device.
+
+    With channels_last, the pixels keep their HWC memory layout behind a CHW view,
+    so there is no permute copy. torch.stack copies into a contiguous batch, so to
+    batch these as channels_last, stack the HWC views (t.permute(1, 2, 0)) and
+    permute the result back.
+    """
+    if isinstance(image, torch.Tensor) and image.dtype == torch.uint8:
+        if channels_last:
+            image = _to_channels_last(image)
+        # The float conversion keeps whatever strides the uint8 tensor has.
+        return image.to(torch.float32).mul_(1.0 / 127.5).sub_(1.0)
+    pixels = np.asarray(image)
+    if pixels.dtype != np.uint8:
+        tensor = _legacy_image_transforms(image)
+        return _to_channels_last(tensor) if channels_last else tensor
+    if channels_last:
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        tensor = torch.from_numpy(pixels.astype(np.float32)).permute(2, 0, 1)
+        return tensor.mul_(1.0 / 127.5).sub_(1.0)
+    tensor = _uint8_pixels_to_tensor(pixels)
+    return tensor.to(torch.float32).mul_(1.0 / 127.5).sub_(1.0)
+
+
+def _to_normalized_tensor_on_device(
+    images: torch.Tensor, device, channels_last: bool = False
+):
+    return _to_normalized_tensor(
+        images.to(device, non_blocking=True), channels_last=channels_last
+    )
+
 
 class MultiaspectImage:
     @staticmethod
-    def get_image_transforms():
-        return transforms.Compose(
-            [
-                transforms.ToTensor(),
-                transforms.Normalize([0.5], [0.5]),
-            ]
+    def get_image_transforms(device=None, channels_last: bool = False):
+        """
+        Get the transform that turns pixels into a normalised tensor for the VAE.
+
+        Args:
+            device (torch.device, optional): When given, the transform expects uint8
+                (N)CHW tensors, moves them to this device and normalises them there,
+                so a stacked batch is handled in one go instead of per-sample on the CPU.
+            channels_last (bool): Return (N)CHW tensors with channels-last strides
+                instead of contiguous ones, for models running in channels_last.
+
+        Returns:
+            callable: The transform.
+        """
+        if device is None:
+            if channels_last:
+                return partial(_to_normalized_tensor, channels_last=True)
+            return _to_normalized_tensor
+        return partial(
+            _to_normalized_tensor_on_device, device=device, channels_last=channels_last
         )
 
     @staticmethod
-    def _round_to_nearest_multiple(value):
-        """Round a value to the nearest multiple."""
-        multiple = StateTracker.get_args().aspect_bucket_alignment
-        rounded = round(value / multiple) * multiple
-        return max(rounded, multiple)  # Ensure it's at least the value of 'multiple'
+    def _round_to_nearest_multiple(value, multiple: int = None):
+        """Round a value to the nearest multiple, by default the bucket alignment."""
+        if multiple is None:
+            multiple = _get_alignment()
+        if isinstance(value, int):
+            # Integer half-to-even, so ties land where round() would put them.
+            quotient, remainder = divmod(value, multiple)
+            if remainder * 2 > multiple or (remainder * 2 == multiple and quotient & 1):
+                quotient += 1
+            rounded = quotient * multiple
+        else:
+            rounded = round(value / multiple) * multiple
+        # Ensure it's at least the value of 'multiple'
+        return rounded if rounded >= multiple else multiple
 
     @staticmethod
     def is_image_too_large(image_size: tuple, resolution: float, resolution_type: str):
@@ -46,12 +215,38 @@ class MultiaspectImage:
             image_area = image_size[0] * image_size[1]
             target_area = resolution * 1e6  # Convert megapixels to pixels
             logger.debug(
-                f"Image is too large? {image_area > target_area} (image area: {image_area}, target area: {target_area})"
+                "Image is too large? %s (image area: %s, target area: %s)",
+                image_area > target_area,
+                image_area,
+                target_area,
             )
             return image_area > target_area
         else:
             raise ValueError(f"Unknown resolution type: {resolution_type}")
 
+    @staticmethod
+    def is_image_too_large_batch(
+        image_sizes: np.ndarray, resolution: float, resolution_type: str
+    ):
+        """
+        Vectorised equivalent of is_image_too_large for a whole dataset scan.
+
+        Args:
+            image_sizes (np.ndarray): (N, 2) array of (W, H) image sizes.
+            resolution (float): The maximum resolution to allow.
+            resolution_type (str): What form of resolution to check, choices: "pixel", "area".
+
+        Returns:
+            np.ndarray: (N,) boolean mask, True where the image is too large.
+        """
+        image_sizes = np.asarray(image_sizes, dtype=np.int64).reshape(-1, 2)
+        if resolution_type == "pixel":
+            return image_sizes.max(axis=1) > resolution
+        elif resolution_type == "area":
+            return image_sizes[:, 0] * image_sizes[:, 1] > resolution * 1e6
+        else:
+            raise ValueError(f"Unknown resolution type: {resolution_type}")
+
     @staticmethod
     def calculate_new_size_by_pixel_edge(
         aspect_ratio: float, resolution: int, original_size: tuple
@@ -64,6 +259,7 @@ class MultiaspectImage:
             raise ValueError(f"Resolution must be an int, not {type(resolution)}")
 
         W_original, H_original = original_size
+        multiple, to_round = _get_bucket_settings()
 
         # Start by determining the potential initial sizes
         if W_original < H_original:  # Portrait or square orientation
@@ -74,8 +270,8 @@ class MultiaspectImage:
             W_initial = int(H_initial * aspect_ratio)
 
         # Round down to ensure we do not exceed original dimensions
-        W_adjusted = MultiaspectImage._round_to_nearest_multiple(W_initial)
-        H_adjusted = MultiaspectImage._round_to_nearest_multiple(H_initial)
+        W_adjusted = MultiaspectImage._round_to_nearest_multiple(W_initial, multiple)
+        H_adjusted = MultiaspectImage._round_to_nearest_multiple(H_initial, multiple)
 
         # Intermediary size might be less than the reformed size.
         # This situation is difficult.
@@ -83,24 +279,19 @@ class MultiaspectImage:
         #  we can't really just boost the size of the reformed image willy-nilly. The intermediary size needs to be larger.
         # We can't increase the intermediary size larger than the original size.
         if W_initial < W_adjusted or H_initial < H_adjusted:
-            logger.debug(
-                f"Intermediary size {W_initial}x{H_initial} would be smaller than {W_adjusted}x{H_adjusted} (original size: {original_size}, aspect ratio: {aspect_ratio})."
-            )
-            # How much leeway to we have between the intermediary size and the reformed size?
-            reformed_W_diff = W_adjusted - W_initial
-            reformed_H_diff = H_adjusted - H_initial
-            bigger_difference = max(reformed_W_diff, reformed_H_diff)
-            logger.debug(
-                f"We have {reformed_W_diff}x{reformed_H_diff} leeway to the reformed image {W_adjusted}x{H_adjusted} from {W_initial}x{H_initial}, adjusting by {bigger_difference}px to both sides: {W_initial + bigger_difference}x{H_initial + bigger_difference}."
+            W_initial, H_initial = (
+                MultiaspectImage.adjust_resolution_to_bucket_interval(
+                    (W_initial, H_initial), (W_adjusted, H_adjusted)
+                )
             )
-            W_initial += bigger_difference
-            H_initial += bigger_difference
 
-        adjusted_aspect_ratio = MultiaspectImage.calculate_image_aspect_ratio(
-            (W_adjusted, H_adjusted)
+        adjusted_aspect_ratio = round(
+            W_adjusted / H_adjusted, 2 if to_round is None else to_round
         )
 
-        return (W_adjusted, H_adjusted), (W_initial, H_initial), adjusted_aspect_ratio
+        return SizingResult(
+            (W_adjusted, H_adjusted), (W_initial, H_initial), adjusted_aspect_ratio
+        )
 
     @staticmethod
     def calculate_new_size_by_pixel_area(
@@ -108,43 +299,70 @@ class MultiaspectImage:
     ):
         if type(aspect_ratio) not in [float, np.float64]:
             raise ValueError(f"Aspect ratio must be a float, not {type(aspect_ratio)}")
+        W_initial, H_initial = original_size
+        multiple, to_round = _get_bucket_settings()
+        resolution_map = StateTracker.aspect_resolution_map.get(megapixels)
+        sized_against, sizes = _size_cache.get(megapixels, (None, None))
+        if sizes is None or sized_against is not resolution_map:
+            sizes = {}
+            _size_cache[megapixels] = (resolution_map, sizes)
+        cached_size = sizes.get(aspect_ratio)
+        if cached_size is not None:
+            if aspect_ratio == 1.0:
+                return cached_size._replace(intermediary=(W_initial, H_initial))
+            return cached_size
+
         target_pixel_area = (
             megapixels * 1e6
         )  # Convert megapixels to pixel area, eg. 1.0 mp = 1000000 pixels
         target_pixel_edge = MultiaspectImage._round_to_nearest_multiple(
-            int(sqrt(target_pixel_area))
+            int(sqrt(target_pixel_area)), multiple
         )
         logger.debug(
-            f"Converted {megapixels} megapixels to {target_pixel_area} pixels with a square edge of {target_pixel_edge}."
+            "Converted %s megapixels to %s pixels with a square edge of %s.",
+            megapixels,
+            target_pixel_area,
+            target_pixel_edge,
         )
 
-        W_initial, H_initial = original_size
         if aspect_ratio == 1.0:
             # If the aspect ratio is 1.0, we can just use the square edge as the target size.
             logger.debug(
-                f"Returning the square edge {target_pixel_edge}x{target_pixel_edge} as the target size and original size as intermediary."
+                "Returning the square edge %sx%s as the target size and original size as intermediary.",
+                target_pixel_edge,
+                target_pixel_edge,
             )
-            return (
+            sizes[aspect_ratio] = SizingResult(
+                (target_pixel_edge, target_pixel_edge),
+                None,
+                aspect_ratio,
+            )
+            return SizingResult(
                 (target_pixel_edge, target_pixel_edge),
                 (W_initial, H_initial),
                 aspect_ratio,
             )
 
         # Calculate the target size. This is what will be cropped-to.
+        sqrt_aspect_ratio = sqrt(aspect_ratio)
         W_target = MultiaspectImage._round_to_nearest_multiple(
-            target_pixel_edge * sqrt(aspect_ratio)
+            target_pixel_edge * sqrt_aspect_ratio, multiple
         )
         H_target = MultiaspectImage._round_to_nearest_multiple(
-            target_pixel_edge / sqrt(aspect_ratio)
+            target_pixel_edge / sqrt_aspect_ratio, multiple
         )
         calculated_resulting_megapixels = (W_target * H_target) / 1e6
-        target_aspect_ratio = MultiaspectImage.calculate_image_aspect_ratio(
-            (W_target, H_target)
+        adjusted_aspect_ratio = round(
+            W_target / H_target, 2 if to_round is None else to_round
         )
+        target_aspect_ratio = adjusted_aspect_ratio
 
-        if not np.isclose(calculated_resulting_megapixels, megapixels, rtol=1e-1):
+        # Same tolerance as np.isclose(rtol=1e-1), without its array machinery for two scalars.
+        megapixel_tolerance = 1e-8 + 1e-1 * abs(megapixels)
+        if abs(calculated_resulting_megapixels - megapixels) > megapixel_tolerance:
             logger.debug(
-                f"-!- This image will not have the correct target megapixel size: {calculated_resulting_megapixels}"
+                "-!- This image will not have the correct target megapixel size: %s",
+                calculated_resulting_megapixels,
             )
 
         # Calculate the intermediary size. This will maintain aspect ratio and be resized-to.
@@ -156,16 +374,15 @@ class MultiaspectImage:
             W_intermediary = int(H_intermediary * aspect_ratio)
 
         # retrieve the static mapping.
-        adjusted_aspect_ratio = MultiaspectImage.calculate_image_aspect_ratio(
-            (W_target, H_target)
-        )
         previously_stored_resolution = StateTracker.get_resolution_by_aspect(
             dataloader_resolution=megapixels, aspect=adjusted_aspect_ratio
         )
 
         if previously_stored_resolution:
             logger.debug(
-                f"Using cached aspect-resolution map value for {adjusted_aspect_ratio}: {previously_stored_resolution}"
+                "Using cached aspect-resolution map value for %s: %s",
+                adjusted_aspect_ratio,
+                previously_stored_resolution,
             )
             W_target, H_target = previously_stored_resolution
         target_resolution = (W_target, H_target)
@@ -183,24 +400,45 @@ class MultiaspectImage:
             H_intermediary += H_diff
             W_intermediary += W_diff
             logger.debug(
-                f"Intermediary size {_W_intermediary}x{_H_intermediary} would be smaller than {W_target}x{H_target} with a difference in size of {W_diff}x{H_diff}."
-                f" The size will be adjusted to maintain the aspect ratio: {W_intermediary}x{H_intermediary}."
+                "Intermediary size %sx%s would be smaller than %sx%s with a difference in size of %sx%s."
+                " The size will be adjusted to maintain the aspect ratio: %sx%s.",
+                _W_intermediary,
+                _H_intermediary,
+                W_target,
+                H_target,
+                W_diff,
+                H_diff,
+                W_intermediary,
+                H_intermediary,
             )
             calculated_resulting_megapixels = (W_intermediary * H_intermediary) / 1e6
 
         intermediary_resolution = (W_intermediary, H_intermediary)
 
         logger.debug(
-            f"Using target size of {megapixels} megapixels:"
-            f"\n-> initial size is {W_initial}x{H_initial}, original aspect ratio {aspect_ratio}."
-            f"\n-> intermediary size is {W_intermediary}x{H_intermediary}, with aspect ratio {adjusted_aspect_ratio}."
-            f"\n-> cropped size is {W_target}x{H_target}, with aspect ratio {target_aspect_ratio}."
-            f"\n-> cropped sample will be {calculated_resulting_megapixels} megapixels"
+            "Using target size of %s megapixels:"
+            "\n-> initial size is %sx%s, original aspect ratio %s."
+            "\n-> intermediary size is %sx%s, with aspect ratio %s."
+            "\n-> cropped size is %sx%s, with aspect ratio %s."
+            "\n-> cropped sample will be %s megapixels",
+            megapixels,
+            W_initial,
+            H_initial,
+            aspect_ratio,
+            W_intermediary,
+            H_intermediary,
+            adjusted_aspect_ratio,
+            W_target,
+            H_target,
+            target_aspect_ratio,
+            calculated_resulting_megapixels,
         )
         # Attempt to retrieve previously stored resolution by adjusted aspect ratio
         if not previously_stored_resolution:
             logger.debug(
-                f"No cached resolution found for aspect ratio {adjusted_aspect_ratio}. Storing {target_resolution}."
+                "No cached resolution found for aspect ratio %s. Storing %s.",
+                adjusted_aspect_ratio,
+                target_resolution,
             )
             StateTracker.set_resolution_by_aspect(
                 dataloader_resolution=megapixels,
@@ -208,7 +446,120 @@ class MultiaspectImage:
                 resolution=target_resolution,
             )
 
-        return (target_resolution, intermediary_resolution, adjusted_aspect_ratio)
+        sizing_result = SizingResult(
+            target_resolution, intermediary_resolution, adjusted_aspect_ratio
+        )
+        sizes[aspect_ratio] = sizing_result
+        if resolution_map is None:
+            # Storing the first resolution created the map for this size; follow it.
+            _size_cache[megapixels] = (
+                StateTracker.aspect_resolution_map.get(megapixels),
+                sizes,
+            )
+        return sizing_result
+
+    @staticmethod
+    def calculate_new_sizes_by_pixel_area_batch(
+        aspect_ratios: np.ndarray, megapixels: float, original_sizes: np.ndarray
+    ):
+        """
+        Vectorised equivalent of calculate_new_size_by_pixel_area for a whole dataset.
+
+        Args:
+            aspect_ratios (np.ndarray): (N,) array of rounded aspect ratios.
+            megapixels (float): The target megapixel size.
+            original_sizes (np.ndarray): (N, 2) array of (W, H) original sizes.
+
+        Returns:
+            SizingResult: (N, 2) target sizes, (N, 2) intermediary sizes and (N,) adjusted aspect ratios.
+        """
+        aspect_ratios = np.asarray(aspect_ratios, dtype=np.float64)
+        original_sizes = np.asarray(original_sizes, dtype=np.int64).reshape(-1, 2)
+        target_pixel_edge = MultiaspectImage._round_to_nearest_multiple(
+            int(sqrt(megapixels * 1e6))
+        )
+
+        # Most aspect ratios land on the pre-computed table; only the rest are calculated.
+        table_index = np.searchsorted(_bucket_table_aspects, aspect_ratios)
+        table_index = table_index.clip(max=len(_bucket_table_aspects) - 1)
+        in_table = _bucket_table_aspects[table_index] == aspect_ratios
+        targets = _get_bucket_table(megapixels, target_pixel_edge)[table_index]
+        if not in_table.all():
+            targets[~in_table] = _area_target_sizes(
+                aspect_ratios[~in_table], target_pixel_edge
+            )
+        W_target, H_target = targets.T
+
+        # Calculate the intermediary size. This will maintain aspect ratio and be resized-to.
+        portrait = W_target < H_target
+        W_intermediary = np.where(
+            portrait, W_target, (H_target * aspect_ratios).astype(np.int64)
+        )
+        H_intermediary = np.where(
+            portrait, (W_target / aspect_ratios).astype(np.int64), H_target
+        )
+
+        # There are only a handful of distinct buckets, so the aspect rounding and the
+        #  static mapping are consulted once per bucket rather than once per image.
+        unique_targets, inverse = np.unique(targets, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        unique_aspects = np.empty(len(unique_targets), dtype=np.float64)
+        # Different targets can share a rounded aspect ratio, and whichever is stored
+        #  first wins. Visit the buckets in the order their first non-square image
+        #  appears, so the mapping ends up as it would image by image. Squares never
+        #  touch the mapping, so buckets holding only squares are not stored.
+        square = aspect_ratios == 1.0
+        first_seen = np.full(len(unique_targets), len(aspect_ratios))
+        np.minimum.at(first_seen, inverse[~square], np.flatnonzero(~square))
+        for idx in np.argsort(first_seen, kind="stable").tolist():
+            W, H = unique_targets[idx].tolist()
+            adjusted_aspect_ratio = MultiaspectImage.calculate_image_aspect_ratio(
+                (W, H)
+            )
+            unique_aspects[idx] = adjusted_aspect_ratio
+            previously_stored_resolution = StateTracker.get_resolution_by_aspect(
+                dataloader_resolution=megapixels, aspect=adjusted_aspect_ratio
+            )
+            if previously_stored_resolution:
+                unique_targets[idx] = previously_stored_resolution
+            elif first_seen[idx] < len(aspect_ratios):
+                StateTracker.set_resolution_by_aspect(
+                    dataloader_resolution=megapixels,
+                    aspect=adjusted_aspect_ratio,
+                    resolution=(W, H),
+                )
+        W_target, H_target = unique_targets[inverse].T
+        adjusted_aspect_ratios = unique_aspects[inverse]
+
+        # The intermediary size might be smaller than the target; grow it to fit.
+        W_short = W_target > W_intermediary
+        H_short = H_target > H_intermediary
+        W_diff = np.where(
+            W_short,
+            W_target - W_intermediary,
+            ((H_target - H_intermediary) * aspect_ratios).astype(np.int64),
+        )
+        H_diff = np.where(
+            W_short,
+            ((W_target - W_intermediary) / aspect_ratios).astype(np.int64),
+            H_target - H_intermediary,
+        )
+        grow = W_short | H_short
+        W_intermediary = np.where(grow, W_intermediary + W_diff, W_intermediary)
+        H_intermediary = np.where(grow, H_intermediary + H_diff, H_intermediary)
+
+        # Square images are sent straight to the square edge at their original size.
+        W_target = np.where(square, target_pixel_edge, W_target)
+        H_target = np.where(square, target_pixel_edge, H_target)
+        W_intermediary = np.where(square, original_sizes[:, 0], W_intermediary)
+        H_intermediary = np.where(square, original_sizes[:, 1], H_intermediary)
+        adjusted_aspect_ratios = np.where(square, aspect_ratios, adjusted_aspect_ratios)
+
+        return SizingResult(
+            np.stack([W_target, H_target], axis=1),
+            np.stack([W_intermediary, H_intermediary], axis=1),
+            adjusted_aspect_ratios,
+        )
 
     @staticmethod
     def adjust_resolution_to_bucket_interval(
@@ -219,20 +570,21 @@ class MultiaspectImage:
         # If W_initial or H_initial are < W_adjusted or H_adjusted, add the greater of the two differences to both values.
         W_diff = W_adjusted - W_initial
         H_diff = H_adjusted - H_initial
-        if W_diff > 0 and (W_diff > H_diff or W_diff == H_diff):
-            logger.debug(
-                f"Intermediary size {W_initial}x{H_initial} would be smaller than {W_adjusted}x{H_adjusted} with a difference in size of {W_diff}x{H_diff}. Adjusting both sides by {max(W_diff, H_diff)} pixels."
-            )
-            H_initial += W_diff
-            W_initial += W_diff
-        elif H_diff > 0 and H_diff > W_diff:
-            logger.debug(
-                f"Intermediary size {W_initial}x{H_initial} would be smaller than {W_adjusted}x{H_adjusted} with a difference in size of {W_diff}x{H_diff}. Adjusting both sides by {max(W_diff, H_diff)} pixels."
-            )
-            W_initial += H_diff
-            H_initial += H_diff
+        bigger_difference = W_diff if W_diff >= H_diff else H_diff
+        if bigger_difference <= 0:
+            return W_initial, H_initial
+        logger.debug(
+            "Intermediary size %sx%s would be smaller than %sx%s with a difference in size of %sx%s. Adjusting both sides by %s pixels.",
+            W_initial,
+            H_initial,
+            W_adjusted,
+            H_adjusted,
+            W_diff,
+            H_diff,
+            bigger_difference,
+        )
 
-        return W_initial, H_initial
+        return W_initial + bigger_difference, H_initial + bigger_difference
 
     @staticmethod
     def calculate_image_aspect_ratio(image, rounding: int = 2):
@@ -245,23 +597,57 @@ class MultiaspectImage:
         Returns:
             float: The rounded aspect ratio of the image.
         """
-        to_round = StateTracker.get_args().aspect_bucket_rounding
+        args = StateTracker.get_args()
+        if args is not _bucket_settings_args:
+            _refresh_bucket_settings(args)
+        to_round = _bucket_settings[1]
         if to_round is None:
             to_round = rounding
-        if isinstance(image, Image.Image):
-            # An actual image was passed in.
-            width, height = image.size
-        elif isinstance(image, tuple) or isinstance(image, list):
-            # An image.size or a similar (W, H) tuple was provided.
-            width, height = image
-        elif isinstance(image, float):
-            # An externally-calculated aspect ratio was given to round.
-            return round(image, to_round)
-        else:
-            width, height = image.size
-        aspect_ratio = round(width / height, to_round)
-        return aspect_ratio
+        return _aspect_ratio_handlers.get(type(image), _aspect_ratio_from_any)(
+            image, to_round
+        )
+
 
+def _aspect_ratio_from_size(size, to_round: int):
+    # An image.size or a similar (W, H) tuple was provided.
+    width, height = size
+    return round(width / height, to_round)
+
+
+def _aspect_ratio_from_float(aspect_ratio, to_round: int):
+    # An externally-calculated aspect ratio was given to round.
+    return round(aspect_ratio, to_round)
+
+
+def _aspect_ratio_from_image(image, to_round: int):
+    # An actual image was passed in.
+    width, height = image.size
+    return round(width / height, to_round)
+
+
+def _aspect_ratio_from_any(image, to_round: int):
+    # Subclasses (eg. PIL's JpegImageFile) miss the exact-type lookup. Resolve them
+    #  the way isinstance would and remember the type for the next image.
+    if isinstance(image, Image.Image):
+        handler = _aspect_ratio_from_image
+    elif isinstance(image, (tuple, list)):
+        handler = _aspect_ratio_from_size
+    elif isinstance(image, float):
+        handler = _aspect_ratio_from_float
+    else:
+        # Anything else with a .size is not remembered; mocks get a class each.
+        return _aspect_ratio_from_image(image, to_round)
+    _aspect_ratio_handlers[type(image)] = handler
+    return handler(image, to_round)
+
+
+_aspect_ratio_handlers = {
+    Image.Image: _aspect_ratio_from_image,
+    tuple: _aspect_ratio_from_size,
+    list: _aspect_ratio_from_size,
+    float: _aspect_ratio_from_float,
+    np.float64: _aspect_ratio_from_float,
+}
 
 resize_helpers = {
     "pixel": MultiaspectImage.calculate_new_size_by_pixel_edge,
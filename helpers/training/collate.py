@@ -6,6 +6,7 @@ from os import environ
 from helpers.training.state_tracker import StateTracker
 from helpers.training.multi_process import rank_info
 from helpers.image_manipulation.training_sample import TrainingSample
+from helpers.multiaspect.image import MultiaspectImage
 from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger("collate_fn")
@@ -94,7 +95,8 @@ def fetch_pixel_values(fp, data_backend_id: str):
         image=image,
         data_backend_id=data_backend_id,
     )
-    return training_sample.prepare(return_tensor=True).image
+    # Normalisation is left to the caller, which does the whole batch at once.
+    return torch.from_numpy(np.array(training_sample.prepare().image))
 
 
 def fetch_latent(fp, data_backend_id: str):
@@ -124,7 +126,11 @@ def deepfloyd_pixels(filepaths, data_backend_id: str):
     except Exception as e:
         logger.error(f"(id={data_backend_id}) Error while computing pixels: {e}")
         raise
-    pixels = torch.stack(pixels)
+    # Stack the uint8 HWC samples and normalise the batch on the training device.
+    pixels = torch.stack(pixels).permute(0, 3, 1, 2)
+    pixels = MultiaspectImage.get_image_transforms(
+        device=StateTracker.get_accelerator().device
+    )(pixels)
     pixels = pixels.to(memory_format=torch.contiguous_format).float()
 
     return pixels
@@ -3,8 +3,12 @@ from unittest.mock import patch, MagicMock
 import numpy as np
 import torch
 
+from PIL import Image
+from torchvision import transforms
+
 from helpers.training.collate import (
     collate_fn,
+    deepfloyd_pixels,
 )  # Adjust this import according to your project structure
 from helpers.training.state_tracker import StateTracker  # Adjust imports as needed
 
@@ -72,6 +76,36 @@ class TestCollateFn(unittest.TestCase):
         # Check that the conditioning dropout was correctly applied (random elements should be zeros)
         # This can be tricky since the dropout is random; you may want to set a fixed random seed or test the structure more than values
 
+    @patch("helpers.training.collate.TrainingSample")
+    def test_deepfloyd_pixels(self, mock_training_sample):
+        # The batch is normalised at once on the accelerator; it must match the
+        #  per-sample ToTensor + Normalize it replaced.
+        filepaths = ["a.png", "b.png", "c.png"]
+        images = {
+            fp: Image.fromarray(np.random.randint(0, 256, (24, 32, 3), dtype=np.uint8))
+            for fp in filepaths
+        }
+        # Samples are fetched on a thread pool, so pair them up by path, not call order.
+        mock_training_sample.side_effect = lambda image, data_backend_id: MagicMock(
+            prepare=MagicMock(return_value=MagicMock(image=image))
+        )
+        reference = transforms.Compose(
+            [transforms.ToTensor(), transforms.Normalize([0.5], [0.5])]
+        )
+        expected = torch.stack([reference(images[fp]) for fp in filepaths])
+        with patch(
+            "helpers.training.state_tracker.StateTracker.get_data_backend",
+            return_value={"data_backend": MagicMock(read_image=images.get)},
+        ), patch(
+            "helpers.training.state_tracker.StateTracker.get_accelerator",
+            return_value=MagicMock(device="cpu"),
+        ):
+            result = deepfloyd_pixels(filepaths, "foo")
+        self.assertEqual(result.shape, (3, 3, 24, 32))
+        self.assertEqual(result.dtype, torch.float32)
+        self.assertTrue(result.is_contiguous())
+        self.assertLess((result - expected).abs().max().item(), 1e-6)
+
     # You can add more test methods to cover different aspects like different dropout probabilities, edge cases, etc.
 
 
@@ -1,12 +1,20 @@
 import unittest, random, logging, os
+import numpy as np
+import torch
 
 logger = logging.getLogger(__name__)
 logger.setLevel(os.environ.get("SIMPLETUNER_LOG_LEVEL", logging.INFO))
 from unittest.mock import patch
 from unittest.mock import Mock, MagicMock
 from PIL import Image
+from torchvision import transforms
 from io import BytesIO
-from helpers.multiaspect.image import MultiaspectImage
+from helpers.multiaspect.image import (
+    MultiaspectImage,
+    _aspect_ratio_handlers,
+    _round_to_nearest_multiple_array,
+    _uint8_pixels_to_tensor,
+)
 from helpers.training.state_tracker import StateTracker
 from tests.helpers.data import MockDataBackend
 
@@ -43,6 +51,128 @@ class TestMultiaspectImage(unittest.TestCase):
         self.assertEqual(
             MultiaspectImage.calculate_image_aspect_ratio((1080, 1920)), 0.56
         )
+        # Image.open hands back subclasses such as JpegImageFile.
+        image = Image.open(BytesIO(self.mock_image_data))
+        self.assertEqual(MultiaspectImage.calculate_image_aspect_ratio(image), 2.0)
+        self.assertIn(type(image), _aspect_ratio_handlers)
+        self.assertEqual(MultiaspectImage.calculate_image_aspect_ratio(image), 2.0)
+
+    def test_image_transforms(self):
+        """
+        Test that the image transforms match torchvision's ToTensor + Normalize.
+        """
+        reference = transforms.Compose(
+            [transforms.ToTensor(), transforms.Normalize([0.5], [0.5])]
+        )
+        transform = MultiaspectImage.get_image_transforms()
+        pixels = np.random.randint(0, 256, (24, 32, 3), dtype=np.uint8)
+        for image in [Image.fromarray(pixels), Image.fromarray(pixels[:, :, 0])]:
+            expected = reference(image)
+            result = transform(image)
+            self.assertEqual(result.shape, expected.shape)
+            self.assertTrue(result.is_contiguous())
+            self.assertLess((result - expected).abs().max().item(), 1e-6)
+        # The intermediate uint8 tensor owns writable memory, not PIL's read-only copy.
+        for image in [Image.fromarray(pixels), Image.fromarray(pixels[:, :, 0])]:
+            self.assertTrue(
+                _uint8_pixels_to_tensor(np.asarray(image)).numpy().flags.writeable
+            )
+        # Decoded uint8 CHW tensors only need normalising.
+        expected = reference(Image.fromarray(pixels))
+        result = transform(torch.from_numpy(pixels).permute(2, 0, 1))
+        self.assertLess((result - expected).abs().max().item(), 1e-6)
+        # channels_last keeps the HWC memory layout behind the CHW shape.
+        result = MultiaspectImage.get_image_transforms(channels_last=True)(
+            Image.fromarray(pixels)
+        )
+        self.assertEqual(result.shape, expected.shape)
+        self.assertLess((result - expected).abs().max().item(), 1e-6)
+        self.assertTrue(
+            result.unsqueeze(0).is_contiguous(memory_format=torch.channels_last)
+        )
+        # A stacked uint8 batch is normalised in one go on the requested device.
+        batch_transform = MultiaspectImage.get_image_transforms(device="cpu")
+        batch = torch.from_numpy(np.stack([pixels, pixels])).permute(0, 3, 1, 2)
+        result = batch_transform(batch)
+        self.assertEqual(result.shape, (2, 3, 24, 32))
+        self.assertLess((result[1] - expected).abs().max().item(), 1e-6)
+        # channels_last is honoured for decoded tensors and batches on a device too.
+        chw = torch.from_numpy(np.ascontiguousarray(pixels.transpose(2, 0, 1)))
+        for transform, image in [
+            (MultiaspectImage.get_image_transforms(channels_last=True), chw),
+            (
+                MultiaspectImage.get_image_transforms(device="cpu", channels_last=True),
+                chw.unsqueeze(0).contiguous(),
+            ),
+        ]:
+            result = transform(image)
+            if result.dim() == 3:
+                result = result.unsqueeze(0)
+            self.assertTrue(result.is_contiguous(memory_format=torch.channels_last))
+        self.assertLess((result[0] - expected).abs().max().item(), 1e-6)
+
+    def test_is_image_too_large_batch(self):
+        """
+        Test that the vectorised size check matches the per-image check.
+        """
+        sizes = [(1024, 1024), (1025, 512), (512, 2048), (4000, 3000), (800, 600)]
+        for resolution, resolution_type in [(1024, "pixel"), (1.0, "area")]:
+            expected = [
+                MultiaspectImage.is_image_too_large(size, resolution, resolution_type)
+                for size in sizes
+            ]
+            result = MultiaspectImage.is_image_too_large_batch(
+                np.array(sizes), resolution, resolution_type
+            )
+            self.assertEqual(result.tolist(), expected)
+        with self.assertRaises(ValueError):
+            MultiaspectImage.is_image_too_large_batch(np.array(sizes), 1.0, "bogus")
+
+    def test_round_to_nearest_multiple_follows_args(self):
+        """
+        Test that the cached bucket alignment is refreshed when the args change.
+        """
+        StateTracker.set_args(MagicMock(aspect_bucket_alignment=64))
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(100), 128)
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(10), 64)
+        StateTracker.set_args(MagicMock(aspect_bucket_alignment=8))
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(100), 96)
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(3), 8)
+
+    def test_round_to_nearest_multiple_ties(self):
+        """
+        Test that exact halves round to the even multiple, as round() does.
+        """
+        StateTracker.set_args(MagicMock(aspect_bucket_alignment=64))
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(160), 128)
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(224), 256)
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(800), 768)
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(800.0), 768)
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(800.5), 832)
+        self.assertEqual(MultiaspectImage._round_to_nearest_multiple(32), 64)
+        # The integer fast path and the batch helper agree with round() everywhere.
+        for multiple in [7, 8, 64]:
+            StateTracker.set_args(MagicMock(aspect_bucket_alignment=multiple))
+            values = list(range(0, 2048)) + [v + 0.5 for v in range(0, 2048)]
+            expected = [max(round(v / multiple) * multiple, multiple) for v in values]
+            self.assertEqual(
+                [MultiaspectImage._round_to_nearest_multiple(v) for v in values],
+                expected,
+            )
+            self.assertEqual(
+                _round_to_nearest_multiple_array(np.array(values), multiple).tolist(),
+                expected,
+            )
+
+    def test_adjust_resolution_to_bucket_interval(self):
+        """
+        Test that the intermediary size grows on both sides by the larger shortfall.
+        """
+        adjust = MultiaspectImage.adjust_resolution_to_bucket_interval
+        self.assertEqual(adjust((1000, 700), (1024, 704)), (1024, 724))
+        self.assertEqual(adjust((700, 1000), (704, 1024)), (724, 1024))
+        self.assertEqual(adjust((1000, 700), (960, 640)), (1000, 700))
+        self.assertEqual(adjust((1000, 700), (960, 704)), (1004, 704))
 
     def test_calculate_new_size_by_pixel_edge(self):
         # Define test cases for 1.0 and 0.5 megapixels
@@ -273,6 +403,128 @@ class TestMultiaspectImage(unittest.TestCase):
                         delta=0.02,
                     )
 
+    def test_calculate_new_sizes_by_pixel_area_batch(self):
+        """
+        Test that the vectorised sizing matches the per-image sizing.
+        """
+        sizes = [(1024, 1024), (1920, 1080), (1080, 1920), (3911, 5476)]
+        sizes += [
+            (random.randint(256, 8192), random.randint(256, 8192)) for _ in range(200)
+        ]
+        with patch(
+            "helpers.training.state_tracker.StateTracker.get_args"
+        ) as mock_args, patch(
+            "helpers.training.state_tracker.StateTracker._save_to_disk"
+        ):
+            mock_args.return_value = Mock(
+                aspect_bucket_rounding=2,
+                aspect_bucket_alignment=64,
+            )
+            # Rounded aspect ratios come from the bucket table, raw ones are calculated.
+            aspect_ratios = [
+                MultiaspectImage.calculate_image_aspect_ratio(size) for size in sizes
+            ] + [W / H for W, H in sizes]
+            # sqrt(1.6416015625) * 1024 is exactly 1312, a tie between two buckets.
+            aspect_ratios.append(1.6416015625)
+            all_sizes = sizes + sizes + [(4104, 2500)]
+            # 0.64 megapixels has a square edge of 800, also a tie.
+            for megapixels in [1.0, 0.64]:
+                # Each side starts from an empty aspect map, so neither can reuse
+                #  a resolution the other stored.
+                with patch.object(StateTracker, "aspect_resolution_map", {}):
+                    expected = [
+                        MultiaspectImage.calculate_new_size_by_pixel_area(
+                            aspect_ratio, megapixels, size
+                        )
+                        for aspect_ratio, size in zip(aspect_ratios, all_sizes)
+                    ]
+                with patch.object(StateTracker, "aspect_resolution_map", {}):
+                    targets, intermediaries, adjusted_aspect_ratios = (
+                        MultiaspectImage.calculate_new_sizes_by_pixel_area_batch(
+                            np.array(aspect_ratios), megapixels, np.array(all_sizes)
+                        )
+                    )
+                if megapixels == 1.0:
+                    self.assertEqual(expected[-1].target[0], 1280)
+                for idx, (target, intermediary, adjusted_aspect_ratio) in enumerate(
+                    expected
+                ):
+                    self.assertEqual(tuple(targets[idx].tolist()), tuple(target))
+                    self.assertEqual(
+                        tuple(intermediaries[idx].tolist()), tuple(intermediary)
+                    )
+                    self.assertEqual(adjusted_aspect_ratios[idx], adjusted_aspect_ratio)
+
+    def test_calculate_new_size_by_pixel_area_cached(self):
+        """
+        Test that repeated sizing of an aspect ratio is served from the cache.
+        """
+        with patch(
+            "helpers.training.state_tracker.StateTracker.get_args"
+        ) as mock_args, patch(
+            "helpers.training.state_tracker.StateTracker._save_to_disk"
+        ), patch.object(
+            StateTracker, "aspect_resolution_map", {}
+        ):
+            mock_args.return_value = Mock(
+                aspect_bucket_rounding=2,
+                aspect_bucket_alignment=64,
+            )
+            with patch.object(
+                StateTracker,
+                "get_resolution_by_aspect",
+                wraps=StateTracker.get_resolution_by_aspect,
+            ) as get_resolution_by_aspect:
+                first = MultiaspectImage.calculate_new_size_by_pixel_area(
+                    0.75, 1.0, (3000, 4000)
+                )
+                second = MultiaspectImage.calculate_new_size_by_pixel_area(
+                    0.75, 1.0, (1500, 2000)
+                )
+                self.assertIs(second, first)
+                self.assertEqual(get_resolution_by_aspect.call_count, 1)
+            self.assertEqual(first.target, first[0])
+            self.assertEqual(first.intermediary, first[1])
+            self.assertEqual(first.aspect, first[2])
+            # Squares keep their original size as the intermediary size.
+            _, intermediary_size, _ = MultiaspectImage.calculate_new_size_by_pixel_area(
+                1.0, 1.0, (2000, 2000)
+            )
+            _, intermediary_size, _ = MultiaspectImage.calculate_new_size_by_pixel_area(
+                1.0, 1.0, (4000, 4000)
+            )
+            self.assertEqual(intermediary_size, (4000, 4000))
+
+    def test_calculate_new_size_by_pixel_area_cache_follows_aspect_map(self):
+        """
+        Test that cached sizes are dropped when the aspect-resolution map is reloaded.
+        """
+        with patch(
+            "helpers.training.state_tracker.StateTracker.get_args"
+        ) as mock_args, patch(
+            "helpers.training.state_tracker.StateTracker._save_to_disk"
+        ), patch(
+            "helpers.training.state_tracker.StateTracker._load_from_disk"
+        ) as load_from_disk, patch.object(
+            StateTracker, "aspect_resolution_map", {1.0: {"0.78": [896, 1152]}}
+        ):
+            mock_args.return_value = Mock(
+                aspect_bucket_rounding=2,
+                aspect_bucket_alignment=64,
+            )
+            target, _, _ = MultiaspectImage.calculate_new_size_by_pixel_area(
+                0.78, 1.0, (3000, 4000)
+            )
+            self.assertEqual(tuple(target), (896, 1152))
+            load_from_disk.return_value = {"0.78": [1024, 1344]}
+            StateTracker.load_aspect_resolution_map(1.0)
+            # Both aspect ratios land in the 0.78 bucket and must share its new size.
+            for aspect_ratio in [0.78, 0.785]:
+                target, _, _ = MultiaspectImage.calculate_new_size_by_pixel_area(
+                    aspect_ratio, 1.0, (3000, 4000)
+                )
+                self.assertEqual(tuple(target), (1024, 1344))
+
     def test_calculate_new_size_by_pixel_area_uniformity(self):
         # Example input resolutions and expected output
         test_cases = [
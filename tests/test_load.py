@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+from io import BytesIO
+from PIL import Image
+from PIL.ImageOps import exif_transpose
+from helpers.image_manipulation.load import (
+    decode_to_tensor,
+    maybe_exif_transpose,
+    read_exif_orientation,
+    EXIF_ORIENTATION_TAG,
+)
+
+
+class TestLoad(unittest.TestCase):
+    def setUp(self):
+        # A smooth gradient keeps JPEG artifacts small enough to compare decoders.
+        x = np.linspace(0, 255, 48, dtype=np.float32)
+        y = np.linspace(0, 255, 32, dtype=np.float32)
+        pixels = np.stack(
+            np.broadcast_arrays(x[None, :], y[:, None], (x[None, :] + y[:, None]) / 2),
+            axis=-1,
+        )
+        self.image = Image.fromarray(pixels.astype(np.uint8))
+
+    def _jpeg_bytes(self, orientation: int = None):
+        image_bytes = BytesIO()
+        exif = Image.Exif()
+        if orientation is not None:
+            exif[EXIF_ORIENTATION_TAG] = orientation
+        self.image.save(image_bytes, format="JPEG", quality=95, exif=exif.tobytes())
+        return image_bytes.getvalue()
+
+    def test_maybe_exif_transpose_skips_default_orientation(self):
+        """Images without a rotation are returned as-is instead of copied."""
+        image = Image.open(BytesIO(self._jpeg_bytes()))
+        self.assertIs(maybe_exif_transpose(image), image)
+        image = Image.open(BytesIO(self._jpeg_bytes(orientation=1)))
+        self.assertIs(maybe_exif_transpose(image), image)
+
+    def test_maybe_exif_transpose_rotates(self):
+        """Images with an orientation tag are transposed like exif_transpose does."""
+        image = Image.open(BytesIO(self._jpeg_bytes(orientation=6)))
+        result = maybe_exif_transpose(image)
+        self.assertEqual(result.size, (32, 48))
+        self.assertEqual(result.tobytes(), exif_transpose(image).tobytes())
+
+    def test_decode_to_tensor_applies_exif_orientation(self):
+        """The tensor decode path matches the PIL decode for every EXIF orientation."""
+        for orientation in range(1, 9):
+            data = self._jpeg_bytes(orientation=orientation)
+            expected = np.asarray(exif_transpose(Image.open(BytesIO(data))))
+            result = decode_to_tensor(data)
+            self.assertEqual(
+                tuple(result.shape), (3, expected.shape[0], expected.shape[1])
+            )
+            difference = np.abs(
+                result.permute(1, 2, 0).numpy().astype(np.int16) - expected
+            )
+            self.assertLessEqual(difference.max(), 8, f"orientation {orientation}")
+
+    def test_decode_to_tensor_malformed_exif(self):
+        """Unreadable EXIF is treated as upright instead of failing the decode."""
+        data = self._jpeg_bytes(orientation=6)
+        with patch.object(
+            Image.Image, "getexif", side_effect=SyntaxError("not a TIFF file")
+        ):
+            self.assertEqual(read_exif_orientation(data), 1)
+            result = decode_to_tensor(data)
+        self.assertEqual(tuple(result.shape), (3, 32, 48))
+
+    def test_decode_to_tensor_non_jpeg(self):
+        """Non-JPEG data falls back to the regular image loader."""
+        image_bytes = BytesIO()
+        self.image.save(image_bytes, format="PNG")
+        result = decode_to_tensor(image_bytes.getvalue())
+        self.assertTrue(
+            np.array_equal(result.permute(1, 2, 0).numpy(), np.asarray(self.image))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()